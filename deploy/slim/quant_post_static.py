@@ -32,6 +32,27 @@ from ppcls.utils import config as conf
 from ppcls.utils.logger import init_logger
 
 
+def get_skip_tensor_list(exe, model_dir):
+    """
+    Get the weights of the first conv and the last fc layer, which are
+    kept in FP32 because quantizing them costs most of the accuracy.
+    """
+    program, _, _ = paddle.static.load_inference_model(
+        model_dir,
+        exe,
+        model_filename='inference.pdmodel',
+        params_filename='inference.pdiparams')
+    ops = program.global_block().ops
+    conv_ops = [op for op in ops if op.type == "conv2d"]
+    fc_ops = [op for op in ops if op.type in ["mul", "matmul", "matmul_v2"]]
+    skip_tensor_list = []
+    if conv_ops:
+        skip_tensor_list.append(conv_ops[0].input("Filter")[0])
+    if fc_ops:
+        skip_tensor_list.append(fc_ops[-1].input("Y")[0])
+    return skip_tensor_list
+
+
 def main():
     args = conf.parse_args()
     config = conf.get_config(args.config, overrides=args.override, show=False)
@@ -45,6 +66,8 @@ def main():
         config["DataLoader"]["Eval"] = config["DataLoader"]["Eval"]["Query"]
     config["DataLoader"]["Eval"]["sampler"]["batch_size"] = 1
     config["DataLoader"]["Eval"]["loader"]["num_workers"] = 0
+    slim_config = config.get("Slim", None) or {}
+    ptq_config = slim_config.get("quant_post_static", None) or {}
 
     init_logger()
     device = paddle.set_device("cpu")
@@ -62,6 +85,9 @@ def main():
     paddle.enable_static()
     place = paddle.CPUPlace()
     exe = paddle.static.Executor(place)
+    skip_tensor_list = get_skip_tensor_list(
+        exe, config["Global"]["save_inference_dir"]) if ptq_config.get(
+            "skip_first_last", True) else None
     paddleslim.quant.quant_post_static(
         executor=exe,
         model_dir=config["Global"]["save_inference_dir"],
@@ -71,7 +97,9 @@ def main():
             config["Global"]["save_inference_dir"], "quant_post_static_model"),
         sample_generator=sample_generator(train_dataloader),
         batch_size=config["DataLoader"]["Eval"]["sampler"]["batch_size"],
-        batch_nums=10)
+        batch_nums=ptq_config.get("batch_nums", 10),
+        algo=ptq_config.get("algo", "hist"),
+        skip_tensor_list=skip_tensor_list)
 
 
 if __name__ == "__main__":
@@ -19,6 +19,7 @@ import shutil
 import cv2
 import numpy as np
 
+import paddle
 from paddle.inference import Config
 from paddle.inference import create_predictor
 
@@ -62,6 +63,13 @@ class Predictor(object):
 
         if args.get("use_gpu", False):
             config.enable_use_gpu(args.gpu_mem, 0)
+            if args.get("cudnn_exhaustive_search", False):
+                # benchmark all cuDNN conv algos once per input shape and cache the fastest
+                paddle.set_flags({
+                    'FLAGS_cudnn_exhaustive_search': 1,
+                    'FLAGS_conv_workspace_size_limit': 4096,
+                    'FLAGS_cudnn_batchnorm_spatial_persistent': 1
+                })
         elif args.get("use_npu", False):
             config.enable_custom_device('npu')
         elif args.get("use_xpu", False):
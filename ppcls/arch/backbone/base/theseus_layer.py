@@ -267,9 +267,10 @@ class TheseusLayer(nn.Layer):
         self.res_dict = {}
 
         class Handler(object):
-            def __init__(self, res_dict):
+            def __init__(self, res_dict, root_layer):
                 # res_dict is a reference
                 self.res_dict = res_dict
+                self.root_layer = root_layer
 
             def __call__(self, layer, pattern):
                 layer.res_dict = self.res_dict
@@ -278,9 +279,13 @@ class TheseusLayer(nn.Layer):
                     layer.hook_remove_helper.remove()
                 layer.hook_remove_helper = layer.register_forward_post_hook(
                     save_sub_res_hook)
+                # mark the hooked layer and its parents, whose outputs (or the
+                # outputs of their sublayers) must not be modified in place
+                for layer_dict in parse_pattern_str(pattern, self.root_layer):
+                    layer_dict["layer"].has_res_hook = True
                 return layer
 
-        handle_func = Handler(self.res_dict)
+        handle_func = Handler(self.res_dict, self)
 
         hit_layer_pattern_list = self.upgrade_sublayer(
             return_patterns, handle_func=handle_func)
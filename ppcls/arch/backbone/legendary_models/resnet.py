@@ -20,7 +20,7 @@ import numpy as np
 import paddle
 from paddle import ParamAttr
 import paddle.nn as nn
-from paddle.nn import Conv2D, BatchNorm, Linear, BatchNorm2D
+from paddle.nn import Conv2D, Linear, BatchNorm2D
 from paddle.nn import MaxPool2D, AvgPool2D
 from paddle.nn.initializer import Uniform
 from paddle.regularizer import L2Decay
@@ -112,6 +112,15 @@ NET_CONFIG = {
 }
 
 
+def make_divisible(v, divisor=8, min_value=None):
+    if min_value is None:
+        min_value = divisor
+    new_v = max(min_value, int(v + divisor / 2) // divisor * divisor)
+    if new_v < 0.9 * v:
+        new_v += divisor
+    return new_v
+
+
 class ConvBNLayer(TheseusLayer):
     def __init__(self,
                  num_channels,
@@ -126,12 +135,13 @@ class ConvBNLayer(TheseusLayer):
         super().__init__()
         self.is_vd_mode = is_vd_mode
         self.act = act
-        self.avg_pool = AvgPool2D(
-            kernel_size=2,
-            stride=stride,
-            padding="SAME",
-            ceil_mode=True,
-            data_format=data_format)
+        if self.is_vd_mode:
+            self.avg_pool = AvgPool2D(
+                kernel_size=2,
+                stride=stride,
+                padding="SAME",
+                ceil_mode=True,
+                data_format=data_format)
         self.conv = Conv2D(
             in_channels=num_channels,
             out_channels=num_filters,
@@ -143,22 +153,67 @@ class ConvBNLayer(TheseusLayer):
             bias_attr=False,
             data_format=data_format)
 
-        self.bn = BatchNorm(
+        # NOTE: unlike the legacy nn.BatchNorm, BatchNorm2D is converted to
+        # SyncBatchNorm by nn.SyncBatchNorm.convert_sync_batchnorm when
+        # Arch.use_sync_bn is True
+        self.bn = BatchNorm2D(
             num_filters,
-            param_attr=ParamAttr(learning_rate=lr_mult),
+            weight_attr=ParamAttr(learning_rate=lr_mult),
             bias_attr=ParamAttr(learning_rate=lr_mult),
-            data_layout=data_format)
+            data_format=data_format)
         self.relu = nn.ReLU()
+        self.is_repped = False
 
     def forward(self, x):
         if self.is_vd_mode:
             x = self.avg_pool(x)
         x = self.conv(x)
-        x = self.bn(x)
+        if not self.is_repped:
+            x = self.bn(x)
         if self.act:
             x = self.relu(x)
         return x
 
+    def re_parameterize(self):
+        # folding BN is only equivalent when the running statistics are frozen,
+        # bn may have been replaced by other norm layers, e.g. MetaBIN, and
+        # conv may have been replaced by QuantizedConv2D by QAT
+        if self.is_repped or self.training:
+            return
+        if not isinstance(self.bn, (BatchNorm2D, nn.SyncBatchNorm)) or type(
+                self.conv) is not Conv2D:
+            return
+
+        kernel, bias = self._fuse_bn_tensor()
+        # take the shape from the kernel, which may have been shrunk by pruning
+        conv = Conv2D(
+            in_channels=kernel.shape[1] * self.conv._groups,
+            out_channels=kernel.shape[0],
+            kernel_size=kernel.shape[2:],
+            stride=self.conv._stride,
+            padding=self.conv._padding,
+            dilation=self.conv._dilation,
+            groups=self.conv._groups,
+            bias_attr=True,
+            data_format=self.conv._data_format)
+        conv.weight.set_value(kernel)
+        conv.bias.set_value(bias)
+
+        self.conv = conv
+        self.__delattr__('bn')
+        self.is_repped = True
+
+    def _fuse_bn_tensor(self):
+        kernel = self.conv.weight
+        running_mean = self.bn._mean
+        running_var = self.bn._variance
+        gamma = self.bn.weight
+        beta = self.bn.bias
+        eps = self.bn._epsilon
+        std = (running_var + eps).sqrt()
+        t = (gamma / std).reshape((-1, 1, 1, 1))
+        return kernel * t, beta - running_mean * gamma / std
+
 
 class BottleneckBlock(TheseusLayer):
     def __init__(self,
@@ -169,8 +224,11 @@ class BottleneckBlock(TheseusLayer):
                  if_first=False,
                  layer=ConvBNLayer,
                  lr_mult=1.0,
-                 data_format="NCHW"):
+                 data_format="NCHW",
+                 num_out_channels=None):
         super().__init__()
+        if num_out_channels is None:
+            num_out_channels = num_filters * 4
         self.conv0 = layer(
             num_channels=num_channels,
             num_filters=num_filters,
@@ -188,7 +246,7 @@ class BottleneckBlock(TheseusLayer):
             data_format=data_format)
         self.conv2 = layer(
             num_channels=num_filters,
-            num_filters=num_filters * 4,
+            num_filters=num_out_channels,
             filter_size=1,
             act=None,
             lr_mult=lr_mult,
@@ -197,7 +255,7 @@ class BottleneckBlock(TheseusLayer):
         if not shortcut:
             self.short = ConvBNLayer(
                 num_channels=num_channels,
-                num_filters=num_filters * 4,
+                num_filters=num_out_channels,
                 filter_size=1,
                 stride=stride,
                 is_vd_mode=False if if_first else True,
@@ -217,7 +275,13 @@ class BottleneckBlock(TheseusLayer):
             short = identity
         else:
             short = self.short(identity)
-        x = paddle.add(x=x, y=short)
+        # accumulate the shortcut into x's buffer when running dygraph without
+        # grad, unless the output of conv2 is kept by 'update_res'
+        if paddle.in_dynamic_mode() and not paddle.is_grad_enabled(
+        ) and not getattr(self.conv2, "has_res_hook", False):
+            x = x.add_(short)
+        else:
+            x = paddle.add(x=x, y=short)
         x = self.relu(x)
         return x
 
@@ -231,8 +295,11 @@ class BasicBlock(TheseusLayer):
                  if_first=False,
                  layer=ConvBNLayer,
                  lr_mult=1.0,
-                 data_format="NCHW"):
+                 data_format="NCHW",
+                 num_out_channels=None):
         super().__init__()
+        if num_out_channels is None:
+            num_out_channels = num_filters
 
         self.stride = stride
         self.conv0 = layer(
@@ -245,7 +312,7 @@ class BasicBlock(TheseusLayer):
             data_format=data_format)
         self.conv1 = layer(
             num_channels=num_filters,
-            num_filters=num_filters,
+            num_filters=num_out_channels,
             filter_size=3,
             act=None,
             lr_mult=lr_mult,
@@ -253,7 +320,7 @@ class BasicBlock(TheseusLayer):
         if not shortcut:
             self.short = ConvBNLayer(
                 num_channels=num_channels,
-                num_filters=num_filters,
+                num_filters=num_out_channels,
                 filter_size=1,
                 stride=stride,
                 is_vd_mode=False if if_first else True,
@@ -270,11 +337,20 @@ class BasicBlock(TheseusLayer):
             short = identity
         else:
             short = self.short(identity)
-        x = paddle.add(x=x, y=short)
+        # accumulate the shortcut into x's buffer when running dygraph without
+        # grad, unless the output of conv1 is kept by 'update_res'
+        if paddle.in_dynamic_mode() and not paddle.is_grad_enabled(
+        ) and not getattr(self.conv1, "has_res_hook", False):
+            x = x.add_(short)
+        else:
+            x = paddle.add(x=x, y=short)
         x = self.relu(x)
         return x
 
 
+BLOCK_TYPES = {"BasicBlock": BasicBlock, "BottleneckBlock": BottleneckBlock}
+
+
 class ResNet(TheseusLayer):
     """
     ResNet
@@ -283,6 +359,7 @@ class ResNet(TheseusLayer):
         version: str="vb". Different version of ResNet, version vd can perform better.
         class_num: int=1000. The number of classes.
         lr_mult_list: list. Control the learning rate of different stages.
+        width_mult: float=1.0. The width multiplier of the inner channels of all blocks and the output channels of the middle stages. The output channels of the first and the last stage are kept, and the pretrained weights are only available when width_mult is 1.0.
     Returns:
         model: nn.Layer. Specific ResNet model depends on args.
     """
@@ -301,10 +378,12 @@ class ResNet(TheseusLayer):
                  return_stages=None,
                  layer_type="ConvBNLayer",
                  use_first_short_conv=True,
+                 width_mult=1.0,
                  **kargs):
         super().__init__()
 
         self.cfg = config
+        self.width_mult = width_mult
         self.lr_mult_list = lr_mult_list
         self.stride_list = stride_list
         self.is_vd_mode = version == "vd"
@@ -314,6 +393,25 @@ class ResNet(TheseusLayer):
         self.block_type = self.cfg["block_type"]
         self.num_channels = self.cfg["num_channels"]
         self.channels_mult = 1 if self.num_channels[-1] == 256 else 4
+        self.out_channels = [
+            num_filters * self.channels_mult
+            for num_filters in self.num_filters
+        ]
+
+        if width_mult != 1.0:
+            self.num_filters = [
+                make_divisible(num_filters * width_mult)
+                for num_filters in self.num_filters
+            ]
+            # keep the output channels of the first and the last stage, so that
+            # the stem and the feature dim consumed by fc or neck are unchanged
+            self.out_channels = [self.out_channels[0]] + [
+                num_filters * self.channels_mult
+                for num_filters in self.num_filters[1:-1]
+            ] + [self.out_channels[-1]]
+            # the input channels of each stage are the output channels of the previous one
+            self.num_channels = [self.num_channels[0]
+                                 ] + self.out_channels[:-1]
 
         if layer_type == "ConvBNLayer":
             layer = ConvBNLayer
@@ -364,17 +462,21 @@ class ResNet(TheseusLayer):
             stride=stride_list[1],
             padding=1,
             data_format=data_format)
+        block = BLOCK_TYPES[self.block_type]
         block_list = []
         for block_idx in range(len(self.block_depth)):
             # paddleclas' special improvement version
             shortcut = False
             # official resnet_vb version
             if not use_first_short_conv and block_idx == 0:
+                assert self.num_channels[0] == self.out_channels[0], \
+                    "use_first_short_conv=False requires the stem output channels ({}) to match the output channels of the first stage ({}).".format(
+                        self.num_channels[0], self.out_channels[0])
                 shortcut = True
             for i in range(self.block_depth[block_idx]):
-                block_list.append(globals()[self.block_type](
-                    num_channels=self.num_channels[block_idx] if i == 0 else
-                    self.num_filters[block_idx] * self.channels_mult,
+                block_list.append(block(
+                    num_channels=self.num_channels[block_idx]
+                    if i == 0 else self.out_channels[block_idx],
                     num_filters=self.num_filters[block_idx],
                     stride=self.stride_list[block_idx + 1]
                     if i == 0 and block_idx != 0 else 1,
@@ -382,13 +484,14 @@ class ResNet(TheseusLayer):
                     if_first=block_idx == i == 0 if version == "vd" else True,
                     layer=layer,
                     lr_mult=self.lr_mult_list[block_idx + 1],
-                    data_format=data_format))
+                    data_format=data_format,
+                    num_out_channels=self.out_channels[block_idx]))
                 shortcut = True
-        self.blocks = nn.Sequential(*block_list)
+        self.blocks = nn.LayerList(block_list)
 
         self.avg_pool = AdaptiveAvgPool2D(1, data_format=data_format)
         self.flatten = nn.Flatten()
-        self.avg_pool_channels = self.num_channels[-1] * 2
+        self.avg_pool_channels = self.out_channels[-1]
         stdv = 1.0 / math.sqrt(self.avg_pool_channels * 1.0)
         self.fc = Linear(
             self.avg_pool_channels,
@@ -412,7 +515,8 @@ class ResNet(TheseusLayer):
             x.stop_gradient = True
         x = self.stem(x)
         x = self.max_pool(x)
-        x = self.blocks(x)
+        for block in self.blocks:
+            x = block(x)
         x = self.avg_pool(x)
         x = self.flatten(x)
         x = self.fc(x)
@@ -420,6 +524,10 @@ class ResNet(TheseusLayer):
 
 
 def _load_pretrained(pretrained, model, model_url, use_ssld):
+    if pretrained is True and getattr(model, "width_mult", 1.0) != 1.0:
+        raise RuntimeError(
+            "The pretrained model is only available when width_mult is 1.0, but got width_mult={}.".
+            format(model.width_mult))
     if pretrained is False:
         pass
     elif pretrained is True:
@@ -226,7 +226,7 @@ class Engine(object):
         # build model
         self.model = build_model(self.config, self.mode)
         # set @to_static for benchmark, skip this by default.
-        apply_to_static(self.config, self.model)
+        self.model = apply_to_static(self.config, self.model)
 
         # load_pretrain
         if self.config["Global"]["pretrained_model"] is not None:
@@ -545,6 +545,8 @@ class Engine(object):
             AMP_RELATED_FLAGS_SETTING = {'FLAGS_max_inplace_grad_add': 8, }
             if paddle.is_compiled_with_cuda():
                 AMP_RELATED_FLAGS_SETTING.update({
+                    'FLAGS_cudnn_exhaustive_search': 1,
+                    'FLAGS_conv_workspace_size_limit': 1500,
                     'FLAGS_cudnn_batchnorm_spatial_persistent': 1
                 })
             paddle.set_flags(AMP_RELATED_FLAGS_SETTING)
@@ -556,6 +558,12 @@ class Engine(object):
                 logger.warning(msg)
                 amp_level = amp_config["level"] = "O1"
 
+            amp_dtype = amp_config.get("dtype", "float16")
+            if amp_dtype not in ["float16", "bfloat16"]:
+                msg = "[Parameter Error]: The dtype of AMP only support 'float16' and 'bfloat16'. The dtype has been set 'float16'."
+                logger.warning(msg)
+                amp_dtype = amp_config["dtype"] = "float16"
+
             amp_eval = self.config["AMP"].get("use_fp16_test", False)
             # TODO(gaotingquan): Paddle not yet support FP32 evaluation when training with AMPO2
             if self.mode == "train" and self.config["Global"].get(
@@ -570,7 +578,8 @@ class Engine(object):
                 use_amp,
                 amp_level=amp_level,
                 use_promote=use_promote,
-                amp_eval=amp_eval)
+                amp_eval=amp_eval,
+                amp_dtype=amp_dtype)
 
             scale_loss = amp_config.get("scale_loss", 1.0)
             use_dynamic_loss_scaling = amp_config.get(
@@ -585,16 +594,21 @@ class Engine(object):
                     models=self.model,
                     optimizers=self.optimizer,
                     level=amp_level,
+                    dtype=amp_dtype,
                     save_dtype='float32')
             elif amp_eval:
                 self.model = paddle.amp.decorate(
-                    models=self.model, level=amp_level, save_dtype='float32')
+                    models=self.model,
+                    level=amp_level,
+                    dtype=amp_dtype,
+                    save_dtype='float32')
 
             if self.mode == "train" and len(self.train_loss_func.parameters(
             )) > 0:
                 self.train_loss_func = paddle.amp.decorate(
                     models=self.train_loss_func,
-                    level=self.amp_level,
+                    level=amp_level,
+                    dtype=amp_dtype,
                     save_dtype='float32')
 
 
@@ -108,6 +108,9 @@ def main(args):
         }
         os.environ['FLAGS_cudnn_batchnorm_spatial_persistent'] = '1'
         paddle.set_flags(AMP_RELATED_FLAGS_SETTING)
+        if amp_config.get("dtype", "float16") != "float16":
+            msg = "The AMP.dtype is only supported in dynamic graph mode and has been ignored, float16 is used in static graph mode."
+            logger.warning(msg)
 
     # visualDL
     vdl_writer = None
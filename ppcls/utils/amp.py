@@ -8,7 +8,8 @@ class AutoCast:
                  use_amp=False,
                  amp_level="O1",
                  use_promote=False,
-                 amp_eval=False):
+                 amp_eval=False,
+                 amp_dtype="float16"):
         self.use_amp = use_amp
         self.amp_eval = amp_eval
 
@@ -20,11 +21,12 @@ class AutoCast:
                 self.cast_context = partial(
                     paddle.amp.auto_cast,
                     level=amp_level,
+                    dtype=amp_dtype,
                     use_promote=use_promote)
             # paddle version <= 2.4.x and not develop
             else:
                 self.cast_context = partial(
-                    paddle.amp.auto_cast, level=amp_level)
+                    paddle.amp.auto_cast, level=amp_level, dtype=amp_dtype)
 
     def __call__(self, is_eval=False):
         if self.use_amp:
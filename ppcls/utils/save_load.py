@@ -85,7 +85,9 @@ def load_dygraph_pretrain(model,
     if not os.path.exists(pretrained_path):
         raise ValueError("Model pretrain path {} does not "
                          "exists.".format(pretrained_path))
-    param_state_dict = paddle.load(pretrained_path)
+    # load as numpy to avoid staging a second copy of every weight on device,
+    # set_dict copies the arrays into the existing parameters directly
+    param_state_dict = paddle.load(pretrained_path, return_numpy=True)
     if isinstance(model, list):
         for m in model:
             if hasattr(m, 'set_dict'):